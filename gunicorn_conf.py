@@ -0,0 +1,19 @@
+# Production entrypoint: gunicorn server:app -c gunicorn_conf.py
+import os
+
+from uvicorn_worker import UvicornWorker
+
+
+class MicroMartWorker(UvicornWorker):
+    # libuv event loop and C HTTP parser instead of the stdlib defaults
+    CONFIG_KWARGS = {
+        "loop": "uvloop",
+        "http": "httptools",
+        "limit_concurrency": int(os.environ.get('LIMIT_CONCURRENCY', 1000)),
+    }
+
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', (os.cpu_count() or 1) * 2 + 1))
+worker_class = MicroMartWorker
+keepalive = 5